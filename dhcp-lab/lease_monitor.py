@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+DHCP Lease Monitor
+
+Reports lease state for the ISC dhcpd server set up by server.sh:
+pool utilization, active/expired counts and lookups by MAC address,
+IP address or hostname.
+
+Usage: python3 lease_monitor.py status
+       python3 lease_monitor.py lookup <MAC|IP|HOSTNAME>
+       python3 lease_monitor.py watch [--interval SECONDS]
+Author: creme332
+
+Notes:
+- dhcpd.leases is an append-only log; the monitor remembers the byte
+  offset it has parsed up to and only reads new records on refresh.
+- dhcpd periodically rewrites the file (new inode, usually smaller).
+  When that is detected the indexes are rebuilt from the start.
+- Lease times in dhcpd.leases are UTC.
+"""
+
+import argparse
+import datetime
+import ipaddress
+import os
+import re
+import sys
+import threading
+import time
+
+LEASES_FILE = "/var/lib/dhcpd/dhcpd.leases"
+DHCPD_CONF = "/etc/dhcp/dhcpd.conf"
+
+RANGE_RE = re.compile(r"^\s*range\s+(?:dynamic-bootp\s+)?([\d.]+)\s+([\d.]+)\s*;", re.M)
+TIME_RE = re.compile(r"\d+ (\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2})")
+EPOCH_RE = re.compile(r"epoch (\d+)")
+# A quoted string (possibly cut off at the end of the text) or a delimiter
+DELIMITER_RE = {
+    chars: re.compile(r'"(?:[^"\\]|\\.)*(?:"|\\?\Z)|[' + chars + "]", re.S)
+    for chars in (";", "}", ";{")
+}
+
+
+def parse_time(value):
+    """Convert a dhcpd time ('4 2024/01/18 10:00:00', 'epoch N' or
+    'never') to a UNIX timestamp, or None for 'never'"""
+    match = EPOCH_RE.match(value)
+    if match:
+        return int(match.group(1))
+    match = TIME_RE.match(value)
+    if match:
+        dt = datetime.datetime.strptime(match.group(1), "%Y/%m/%d %H:%M:%S")
+        return dt.replace(tzinfo=datetime.timezone.utc).timestamp()
+    return None
+
+
+def find_unquoted(text, chars, start=0):
+    """Like text.find() for any of chars, but skips quoted strings, which
+    may contain any printable character and backslash escapes"""
+    for match in DELIMITER_RE[chars].finditer(text, start):
+        if not match.group().startswith('"'):
+            return match.start()
+    return -1
+
+
+def split_statements(body):
+    """Split a block body on the semicolons outside quoted strings"""
+    statements = []
+    pos = 0
+    while True:
+        end = find_unquoted(body, ";", pos)
+        if end < 0:
+            statements.append(body[pos:])
+            return statements
+        statements.append(body[pos:end])
+        pos = end + 1
+
+
+def parse_lease(ip, body):
+    """Parse the statements inside a 'lease <ip> { ... }' block"""
+    lease = {"ip": ip, "state": None, "mac": None, "hostname": None,
+             "starts": None, "ends": None}
+    for statement in split_statements(body):
+        statement = statement.strip()
+        if statement.startswith("starts "):
+            lease["starts"] = parse_time(statement[len("starts "):])
+        elif statement.startswith("ends "):
+            lease["ends"] = parse_time(statement[len("ends "):])
+        elif statement.startswith("binding state "):
+            lease["state"] = statement[len("binding state "):]
+        elif statement.startswith("hardware ethernet "):
+            lease["mac"] = statement[len("hardware ethernet "):].lower()
+        elif statement.startswith("client-hostname "):
+            lease["hostname"] = statement[len("client-hostname "):].strip('"')
+    return lease
+
+
+def read_pool_ranges(conf=DHCPD_CONF):
+    """Return [(start, end)] ipaddress pairs for every range statement"""
+    try:
+        with open(conf, "r", encoding="utf-8") as f:
+            text = f.read()
+    except OSError:
+        return []
+    return [(ipaddress.IPv4Address(a), ipaddress.IPv4Address(b))
+            for a, b in RANGE_RE.findall(text)]
+
+
+class LeaseMonitor:
+    def __init__(self, leases_file=LEASES_FILE, conf=DHCPD_CONF):
+        self.leases_file = leases_file
+        self.conf = conf
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.inode = None
+        self.offset = 0
+        self.by_ip = {}
+        self.by_mac = {}
+        self.by_hostname = {}
+        self.records_parsed = 0
+
+    def index(self, lease):
+        """Add a lease record, superseding earlier records for its IP"""
+        old = self.by_ip.get(lease["ip"])
+        if old:
+            if old["mac"] and self.by_mac.get(old["mac"]) == old["ip"]:
+                del self.by_mac[old["mac"]]
+            hostname = (old["hostname"] or "").lower()
+            if hostname and self.by_hostname.get(hostname) == old["ip"]:
+                del self.by_hostname[hostname]
+        self.by_ip[lease["ip"]] = lease
+        if lease["mac"]:
+            self.by_mac[lease["mac"]] = lease["ip"]
+        if lease["hostname"]:
+            self.by_hostname[lease["hostname"].lower()] = lease["ip"]
+        self.records_parsed += 1
+
+    def parse(self, text):
+        """Index every complete lease block in text.
+        Returns the number of characters consumed."""
+        pos = 0
+        while True:
+            while pos < len(text) and text[pos].isspace():
+                pos += 1
+            if text.startswith("#", pos):
+                newline = text.find("\n", pos)
+                if newline < 0:
+                    break
+                pos = newline + 1
+                continue
+            # A declaration ends with ';' or a '{ ... }' block; quoted
+            # strings (uid, set ...) may contain either character
+            stop = find_unquoted(text, ";{", pos)
+            if stop < 0:
+                break
+            if text[stop] == ";":
+                pos = stop + 1
+                continue
+            brace = stop
+            end = find_unquoted(text, "}", brace)
+            if end < 0:
+                break
+            header = text[pos:brace].strip()
+            if header.startswith("lease "):
+                ip = header[len("lease "):].strip()
+                self.index(parse_lease(ip, text[brace + 1:end]))
+            pos = end + 1
+        # Anything after the last complete declaration is re-read next time
+        return pos
+
+    def refresh(self):
+        """Read lease records appended since the last refresh"""
+        with self.lock:
+            try:
+                st = os.stat(self.leases_file)
+            except OSError:
+                self.reset()
+                return 0
+            if st.st_ino != self.inode or st.st_size < self.offset:
+                # dhcpd rewrote the file, start over
+                self.reset()
+                self.inode = st.st_ino
+            if st.st_size == self.offset:
+                return 0
+            before = self.records_parsed
+            with open(self.leases_file, "rb") as f:
+                f.seek(self.offset)
+                data = f.read()
+            # dhcpd escapes non-ASCII bytes, latin-1 keeps offsets 1:1
+            self.offset += self.parse(data.decode("latin-1"))
+            return self.records_parsed - before
+
+    def lookup(self, key):
+        """Find a lease by IP, MAC or hostname"""
+        key = key.strip()
+        with self.lock:
+            if key in self.by_ip:
+                return self.by_ip[key]
+            ip = self.by_mac.get(key.lower()) or self.by_hostname.get(key.lower())
+            return self.by_ip.get(ip) if ip else None
+
+    def is_active(self, lease, now):
+        return (lease["state"] == "active"
+                and (lease["ends"] is None or lease["ends"] > now))
+
+    def is_expired(self, lease, now):
+        """An active lease past its end time, or one dhcpd marked expired.
+        Free, backup, released and abandoned leases are not counted."""
+        return (lease["state"] == "expired"
+                or (lease["state"] == "active" and not self.is_active(lease, now)))
+
+    def summary(self, now=None):
+        """Return lease counts per state and pool utilization"""
+        now = now or time.time()
+        # The web UI refreshes from other threads while this one reads
+        with self.lock:
+            leases = list(self.by_ip.values())
+            records_parsed = self.records_parsed
+        active = [l for l in leases if self.is_active(l, now)]
+        pools = []
+        for start, end in read_pool_ranges(self.conf):
+            size = int(end) - int(start) + 1
+            used = sum(1 for l in active
+                       if start <= ipaddress.IPv4Address(l["ip"]) <= end)
+            pools.append({
+                "range": f"{start}-{end}",
+                "size": size,
+                "active": used,
+                "utilization": round(100.0 * used / size, 1) if size > 0 else 0.0,
+            })
+        states = {}
+        for lease in leases:
+            state = lease["state"] or "unknown"
+            states[state] = states.get(state, 0) + 1
+        return {
+            "leases": len(leases),
+            "active": len(active),
+            "expired": sum(1 for l in leases if self.is_expired(l, now)),
+            "states": states,
+            "pools": pools,
+            "records_parsed": records_parsed,
+        }
+
+    def active_leases(self, now=None):
+        now = now or time.time()
+        with self.lock:
+            leases = list(self.by_ip.values())
+        return sorted((l for l in leases if self.is_active(l, now)),
+                      key=lambda l: ipaddress.IPv4Address(l["ip"]))
+
+
+def format_time(ts):
+    if ts is None:
+        return "never"
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def print_status(monitor):
+    summary = monitor.summary()
+    print(f"Leases: {summary['leases']} ({summary['active']} active, "
+          f"{summary['expired']} expired)")
+    print("States: " + ", ".join(f"{state} {count}" for state, count
+                                 in sorted(summary["states"].items())))
+    for pool in summary["pools"]:
+        print(f"Pool {pool['range']}: {pool['active']}/{pool['size']} "
+              f"({pool['utilization']}%)")
+    for lease in monitor.active_leases():
+        print(f"  {lease['ip']:<15}  {lease['mac'] or '-':<17}  "
+              f"{lease['hostname'] or '-':<20}  ends {format_time(lease['ends'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DHCP lease monitor")
+    parser.add_argument("--leases", default=LEASES_FILE)
+    parser.add_argument("--conf", default=DHCPD_CONF)
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("status", help="show pool utilization and active leases")
+    p = sub.add_parser("lookup", help="find a lease by MAC, IP or hostname")
+    p.add_argument("key")
+    p = sub.add_parser("watch", help="print status whenever leases change")
+    p.add_argument("--interval", type=float, default=5)
+    args = parser.parse_args()
+
+    monitor = LeaseMonitor(args.leases, args.conf)
+    monitor.refresh()
+    if args.command == "status":
+        print_status(monitor)
+    elif args.command == "lookup":
+        lease = monitor.lookup(args.key)
+        if lease is None:
+            print(f"No lease found for {args.key}")
+            sys.exit(1)
+        print(f"IP: {lease['ip']}\nMAC: {lease['mac']}\n"
+              f"Hostname: {lease['hostname']}\nState: {lease['state']}\n"
+              f"Starts: {format_time(lease['starts'])}\nEnds: {format_time(lease['ends'])}")
+    elif args.command == "watch":
+        print_status(monitor)
+        try:
+            while True:
+                time.sleep(args.interval)
+                if monitor.refresh():
+                    print(f"\n--- {datetime.datetime.now():%H:%M:%S} ---")
+                    print_status(monitor)
+        except KeyboardInterrupt:
+            pass
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@
 #              setup, dhcpd.conf creation, and validation.
 #              All parameters are required - no defaults.
 # Usage: bash server.sh SERVER_IP RANGE_START RANGE_END NETMASK GATEWAY
-# Version: 1.2
+# Version: 1.3
 # Author: creme332
 #------------------------------------------------------------------------------------
 # Requirements:
@@ -228,15 +228,28 @@ fi
 echo "Validation complete."
 echo ""
 
+CONFIG_STORE="/usr/local/sbin/config_store.py"
+CONFIG_STORE_URL="https://raw.githubusercontent.com/creme332/centos-scripts/refs/heads/main/helper/config_store.py"
+
 # Function to create backups
+# Every revision is recorded in the config snapshot store. A plain copy
+# of the original file is kept once in ~/dhcp-backup for uninstall-server.sh.
 backup_file() {
     local file="$1"
     local backup_dir="$HOME/dhcp-backup"
     mkdir -p "$backup_dir"
     
     if [ -f "$file" ]; then
+        if [ -f "$CONFIG_STORE" ]; then
+            python3 "$CONFIG_STORE" record "$file" || echo "Warning: could not record $file in config store"
+        fi
+
         # Get just the filename, replacing / with _ to flatten the path
         local filename=$(echo "$file" | sed 's|/|_|g')
+        if compgen -G "${backup_dir}/${filename}.backup.*" >/dev/null; then
+            echo "Original $file already backed up in $backup_dir"
+            return 0
+        fi
         local backup="${backup_dir}/${filename}.backup.${DATE_SUFFIX}"
         cp -p "$file" "$backup"
         echo "Backup of $file saved as $backup"
@@ -248,7 +261,8 @@ backup_file() {
 
 # Step 0: Install DHCP server
 echo "Installing DHCP package..."
-yum install -y dhcp net-tools
+yum install -y dhcp net-tools python3
+curl -fsS -o "$CONFIG_STORE" "$CONFIG_STORE_URL" || echo "Warning: could not download config store"
 
 # Step 1: Detect primary NIC using ip (non-loopback)
 PRIMARY_IF=$(ip -o link show | awk -F': ' '$2 != "lo"{print $2}' | head -n1)
@@ -341,6 +355,9 @@ subnet $SUBNET netmask $NETMASK {
 EOF
 
 echo "$DHCP_CONF configured with subnet $SUBNET and range $DHCP_RANGE_START-$DHCP_RANGE_END"
+if [ -f "$CONFIG_STORE" ]; then
+    python3 "$CONFIG_STORE" record "$DHCP_CONF" || echo "Warning: could not record $DHCP_CONF in config store"
+fi
 
 # Step 5: Validate DHCP configuration (don't enable or start service)
 echo "Validating DHCP configuration..."
@@ -354,6 +371,7 @@ fi
 
 echo "DHCP Server setup complete."
 echo "Backups are found in ~/dhcp-backup"
+echo "Revision history: python3 $CONFIG_STORE list"
 echo ""
 echo "=== Configuration Summary ==="
 echo "  Server IP: $STATIC_IP"
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Config Snapshot Store
+
+Keeps the revision history of configuration files touched by the lab
+scripts (Postfix/Dovecot, /etc/exports, dhcpd.conf, OpenVPN
+server.conf, ...). File contents are stored once, zlib-compressed and
+keyed by SHA-256, so identical revisions of any file share storage.
+
+Usage: python3 config_store.py record PATH...
+       python3 config_store.py list
+       python3 config_store.py log PATH
+       python3 config_store.py show PATH [REV]
+       python3 config_store.py diff PATH [REV_A [REV_B]]
+       python3 config_store.py restore PATH REV
+Author: creme332
+
+Notes:
+- Recording a file whose content matches its latest revision does
+  nothing.
+- diff compares the latest revision with the file on disk by default.
+- restore records the current file first, so it can be undone. The
+  restored file gets the recorded mode, owner and group, and keeps the
+  SELinux label of the file it replaces (restorecon sets the default
+  label if the file was missing).
+"""
+
+import argparse
+import datetime
+import difflib
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import zlib
+from urllib.parse import quote, unquote
+
+STORE_DIR = "/var/lib/config-store"
+
+
+class StoreError(Exception):
+    pass
+
+
+def object_path(digest, root=STORE_DIR):
+    return os.path.join(root, "objects", digest[:2], digest[2:] + ".z")
+
+
+def history_path(path, root=STORE_DIR):
+    return os.path.join(root, "history", quote(os.path.abspath(path), safe="") + ".json")
+
+
+def write_atomic(dest, data, mode=0o600, uid=-1, gid=-1):
+    """Replace dest with data. If dest exists its SELinux label is
+    carried over to the new file."""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = f"{dest}.tmp.{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.chown(tmp, uid, gid)
+    os.chmod(tmp, mode)
+    try:
+        os.setxattr(tmp, "security.selinux", os.getxattr(dest, "security.selinux"))
+    except OSError:
+        pass
+    os.replace(tmp, dest)
+
+
+def log(path, root=STORE_DIR):
+    """Return the revisions of path, oldest first"""
+    try:
+        with open(history_path(path, root), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def tracked(root=STORE_DIR):
+    """Return a summary of every tracked file"""
+    history_dir = os.path.join(root, "history")
+    if not os.path.isdir(history_dir):
+        return []
+    files = []
+    for name in sorted(os.listdir(history_dir)):
+        if not name.endswith(".json"):
+            continue
+        path = unquote(name[:-len(".json")])
+        revisions = log(path, root)
+        if revisions:
+            files.append({
+                "path": path,
+                "revisions": len(revisions),
+                "latest": revisions[-1]["time"],
+            })
+    return files
+
+
+def get_revision(path, rev=None, root=STORE_DIR):
+    revisions = log(path, root)
+    if not revisions:
+        raise StoreError(f"{path} is not tracked")
+    if rev is None:
+        return revisions[-1]
+    for revision in revisions:
+        if revision["rev"] == rev:
+            return revision
+    raise StoreError(f"{path} has no revision {rev}")
+
+
+def read(path, rev=None, root=STORE_DIR):
+    """Return the content of a revision (latest by default)"""
+    revision = get_revision(path, rev, root)
+    with open(object_path(revision["sha256"], root), "rb") as f:
+        return zlib.decompress(f.read())
+
+
+def record(path, root=STORE_DIR):
+    """Store the current content of path as a new revision.
+    Returns (revision, created); created is False if unchanged."""
+    path = os.path.abspath(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    revisions = log(path, root)
+    if revisions and revisions[-1]["sha256"] == digest:
+        return revisions[-1], False
+
+    st = os.stat(path)
+    obj = object_path(digest, root)
+    if not os.path.exists(obj):
+        write_atomic(obj, zlib.compress(data, 9))
+
+    revision = {
+        "rev": revisions[-1]["rev"] + 1 if revisions else 1,
+        "sha256": digest,
+        "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "size": len(data),
+        "mode": st.st_mode & 0o7777,
+        "uid": st.st_uid,
+        "gid": st.st_gid,
+    }
+    revisions.append(revision)
+    write_atomic(history_path(path, root),
+                 json.dumps(revisions, indent=1).encode("utf-8"))
+    return revision, True
+
+
+def diff(path, rev_a=None, rev_b=None, root=STORE_DIR):
+    """Unified diff between two revisions. rev_a defaults to the latest
+    revision and rev_b to the file currently on disk."""
+    a = get_revision(path, rev_a, root)
+    old = read(path, a["rev"], root)
+    if rev_b is None:
+        try:
+            with open(path, "rb") as f:
+                new = f.read()
+        except FileNotFoundError:
+            new = b""
+        new_label = f"{path} (current)"
+    else:
+        new = read(path, rev_b, root)
+        new_label = f"{path} (rev {rev_b})"
+    return "".join(difflib.unified_diff(
+        old.decode("utf-8", "replace").splitlines(True),
+        new.decode("utf-8", "replace").splitlines(True),
+        f"{path} (rev {a['rev']})", new_label))
+
+
+def restore(path, rev, root=STORE_DIR):
+    """Overwrite path with a stored revision, keeping the current
+    content as a revision first"""
+    path = os.path.abspath(path)
+    revision = get_revision(path, rev, root)
+    existed = os.path.exists(path)
+    uid = gid = -1
+    if existed:
+        record(path, root)
+        st = os.stat(path)
+        uid, gid = st.st_uid, st.st_gid
+    # Revisions recorded before uid/gid were stored keep the current owner
+    write_atomic(path, read(path, rev, root), revision["mode"],
+                 revision.get("uid", uid), revision.get("gid", gid))
+    if not existed and shutil.which("restorecon"):
+        subprocess.run(["restorecon", path], check=False)
+    return record(path, root)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Config snapshot store")
+    parser.add_argument("--store", default=STORE_DIR,
+                        help=f"store directory (default: {STORE_DIR})")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("record", help="record new revisions of files")
+    p.add_argument("paths", nargs="+")
+    sub.add_parser("list", help="list tracked files")
+    p = sub.add_parser("log", help="list revisions of a file")
+    p.add_argument("path")
+    p = sub.add_parser("show", help="print a revision")
+    p.add_argument("path")
+    p.add_argument("rev", type=int, nargs="?")
+    p = sub.add_parser("diff", help="diff revisions or the file on disk")
+    p.add_argument("path")
+    p.add_argument("rev_a", type=int, nargs="?")
+    p.add_argument("rev_b", type=int, nargs="?")
+    p = sub.add_parser("restore", help="restore a revision")
+    p.add_argument("path")
+    p.add_argument("rev", type=int)
+    args = parser.parse_args()
+
+    try:
+        if args.command == "record":
+            for path in args.paths:
+                if not os.path.isfile(path):
+                    print(f"File {path} does not exist, skipping.")
+                    continue
+                revision, created = record(path, args.store)
+                state = "Recorded" if created else "Unchanged"
+                print(f"{state} {path} (rev {revision['rev']})")
+        elif args.command == "list":
+            for info in tracked(args.store):
+                print(f"{info['path']}  {info['revisions']} revisions  "
+                      f"latest {info['latest']}")
+        elif args.command == "log":
+            for revision in log(args.path, args.store):
+                print(f"rev {revision['rev']}  {revision['time']}  "
+                      f"{revision['size']} bytes  {revision['sha256'][:12]}")
+        elif args.command == "show":
+            sys.stdout.write(read(args.path, args.rev, args.store)
+                             .decode("utf-8", "replace"))
+        elif args.command == "diff":
+            sys.stdout.write(diff(args.path, args.rev_a, args.rev_b, args.store))
+        elif args.command == "restore":
+            revision = restore(args.path, args.rev, args.store)
+            print(f"Restored {args.path} from rev {args.rev} (now rev {revision['rev']})")
+        else:
+            parser.print_help()
+            sys.exit(1)
+    except StoreError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,10 @@
 
 #--------------------------------------------------------------
 # Script Name: Backup Mail Server Configurations on CentOS 7
-# Description: Creates a backup of Postfix and Dovecot configuration files.
-# Version: 0.1
+# Description: Records a revision of Postfix and Dovecot configuration
+#              files in the config snapshot store. Unchanged files
+#              are not stored again.
+# Version: 0.2
 # Author: creme332
 #--------------------------------------------------------------
 # Requirements:
@@ -12,12 +14,15 @@
 
 set -euo pipefail
 
-# Define backup directory
-BACKUP_DIR="/var/backups/mail_server"
-DATE=$(date +"%Y%m%d%H%M")
+CONFIG_STORE="/usr/local/sbin/config_store.py"
+CONFIG_STORE_URL="https://raw.githubusercontent.com/creme332/centos-scripts/refs/heads/main/helper/config_store.py"
 
-# Create the backup directory if it doesn't exist
-mkdir -p "$BACKUP_DIR"
+# Install the config snapshot store if needed
+command -v python3 >/dev/null 2>&1 || yum install -y python3
+if [ ! -f "$CONFIG_STORE" ]; then
+    curl -fsS -o "$CONFIG_STORE" "$CONFIG_STORE_URL"
+    chmod 0755 "$CONFIG_STORE"
+fi
 
 # Define the files to back up
 FILES=(
@@ -27,21 +32,14 @@ FILES=(
     "/etc/dovecot/conf.d/10-master.conf"
     "/etc/dovecot/conf.d/10-auth.conf"
     "/etc/dovecot/conf.d/10-mail.conf"
-    "/etc/dovecot/conf.d/20-pop3.conf",
-    "/etc/sysconfig/spamass-milter",
-    "/etc/dovecot/conf.d/15-lda.conf",
-    "/etc/dovecot/conf.d/20-lmtp.conf",
-    "/etc/dovecot/conf.d/90-sieve.conf",
+    "/etc/dovecot/conf.d/20-pop3.conf"
+    "/etc/sysconfig/spamass-milter"
+    "/etc/dovecot/conf.d/15-lda.conf"
+    "/etc/dovecot/conf.d/20-lmtp.conf"
+    "/etc/dovecot/conf.d/90-sieve.conf"
 )
 
-# Loop through the files and copy them to the backup directory with a timestamp
-for FILE in "${FILES[@]}"; do
-    if [ -f "$FILE" ]; then
-        cp "$FILE" "$BACKUP_DIR/$(basename $FILE).$DATE"
-        echo "Backed up $FILE to $BACKUP_DIR/$(basename $FILE).$DATE"
-    else
-        echo "File $FILE does not exist, skipping."
-    fi
-done
+# Record a new revision of each file that changed
+python3 "$CONFIG_STORE" record "${FILES[@]}"
 
-echo "Backup completed."
+echo "Backup completed. View history with: python3 $CONFIG_STORE list"
@@ -6,7 +6,7 @@
 #              CentOS 7.9 machine. Handles rpcbind socket,
 #              firewall, SELinux settings, and mounts local share.
 # Usage: Run the script as root using bash nfs-server.sh
-# Version: 0.1
+# Version: 0.2
 # Author: creme332
 #--------------------------------------------------------------
 # Requirements:
@@ -96,8 +96,18 @@ fi
 echo "Using server IP: $SERVER_IP"
 
 # --- Backup exports ---
+# Revisions are kept in the config snapshot store; unchanged files are
+# not stored again. Falls back to a timestamped copy.
+CONFIG_STORE="/usr/local/sbin/config_store.py"
+CONFIG_STORE_URL="https://raw.githubusercontent.com/creme332/centos-scripts/refs/heads/main/helper/config_store.py"
 if [[ -f /etc/exports ]]; then
-    cp /etc/exports /etc/exports.backup.$(date +%F-%T)
+    # Failures here only mean the fallback copy is used
+    yum -y install python3 || true
+    [[ -f "$CONFIG_STORE" ]] || curl -fsS -o "$CONFIG_STORE" "$CONFIG_STORE_URL" || true
+    chmod 0755 "$CONFIG_STORE" 2>/dev/null || true
+    if ! python3 "$CONFIG_STORE" record /etc/exports; then
+        cp /etc/exports /etc/exports.backup.$(date +%F-%T)
+    fi
 fi
 
 # --- Configure exports ---
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+NFS Share Usage
+
+Reports who is filling the NFS shares created by protect.sh: bytes
+and file counts per owner and per directory, the top consumers, and
+growth over time.
+
+Usage: python3 nfs_usage.py scan [--top N] [--full]
+       python3 nfs_usage.py growth [--days N]
+Author: creme332
+
+Notes:
+- Directories are listed in parallel by a thread pool.
+- Each directory's mtime and per-owner totals of the files directly
+  inside it are cached in CACHE_FILE. A directory whose mtime has not
+  changed is not listed and its files are not stat'ed again; only its
+  subdirectories are checked, so rescans only descend into changed
+  subtrees.
+- A file that grows in place or changes owner does not change its
+  directory's mtime. Run a --full scan now and then (e.g. weekly from
+  cron) to recount everything.
+- Scans from the command line append per-owner totals to HISTORY_FILE
+  for growth; scans from the web UI do not, so refreshing the page
+  does not push older entries out of the history.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import pwd
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+SHARES = ["/nfsshare/public", "/nfsshare/private"]
+CACHE_FILE = "/var/lib/nfs-usage/cache.json"
+HISTORY_FILE = "/var/lib/nfs-usage/history.jsonl"
+HISTORY_LIMIT = 1000
+DIR_DEPTH = 2
+TOP = 10
+WORKERS = 8
+
+
+def owner_name(uid):
+    try:
+        return pwd.getpwuid(int(uid)).pw_name
+    except (KeyError, ValueError):
+        return str(uid)
+
+
+def load_json(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # A unique tmp file, since the web UI may save from several threads
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def list_dir(path, cached):
+    """Return the cache entry for one directory, listing it only if its
+    mtime changed. Entry: mtime_ns, owners {uid: [bytes, files]}, subdirs."""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None, False
+    if cached and cached["mtime_ns"] == mtime_ns and "owners" in cached:
+        return cached, False
+
+    entry = {"mtime_ns": mtime_ns, "owners": {}, "subdirs": []}
+    try:
+        with os.scandir(path) as it:
+            for child in it:
+                if child.is_dir(follow_symlinks=False):
+                    entry["subdirs"].append(child.name)
+                    continue
+                st = child.stat(follow_symlinks=False)
+                totals = entry["owners"].setdefault(str(st.st_uid), [0, 0])
+                totals[0] += st.st_size
+                totals[1] += 1
+    except OSError as e:
+        print(f"[WARN] Cannot read {path}: {e}", file=sys.stderr)
+    return entry, True
+
+
+def walk(shares, cache, workers=WORKERS):
+    """List every directory under the shares in parallel.
+    Returns (dirs, listed) where dirs maps path -> cache entry."""
+    dirs = {}
+    listed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(list_dir, share, cache.get(share)): share
+                   for share in shares}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                entry, fresh = future.result()
+                if entry is None:
+                    continue
+                dirs[path] = entry
+                listed += fresh
+                for name in entry["subdirs"]:
+                    child = os.path.join(path, name)
+                    pending[pool.submit(list_dir, child, cache.get(child))] = child
+    return dirs, listed
+
+
+def aggregate(shares, dirs, depth=DIR_DEPTH):
+    """Total bytes/files per share, per owner and per directory. Files
+    count towards every ancestor directory at most `depth` levels below
+    their share, like du --max-depth."""
+    report = {"shares": {}, "owners": {}, "dirs": {}}
+    for share in shares:
+        report["shares"][share] = {"bytes": 0, "files": 0}
+    for path, entry in dirs.items():
+        share = next((s for s in shares
+                      if path == s or path.startswith(s.rstrip("/") + "/")), None)
+        if share is None:
+            continue
+        rel = os.path.relpath(path, share)
+        parts = [] if rel == "." else rel.split(os.sep)
+        buckets = [os.path.join(share, *parts[:i])
+                   for i in range(1, min(len(parts), depth) + 1)]
+        for uid, (size, count) in entry["owners"].items():
+            targets = [report["shares"][share],
+                       report["owners"].setdefault(owner_name(uid),
+                                                   {"bytes": 0, "files": 0})]
+            targets += [report["dirs"].setdefault(bucket, {"bytes": 0, "files": 0})
+                        for bucket in buckets]
+            for totals in targets:
+                totals["bytes"] += size
+                totals["files"] += count
+    return report
+
+
+def top(totals, n=TOP):
+    """Return the n largest entries of a {name: {bytes, files}} dict"""
+    ranked = sorted(totals.items(), key=lambda item: item[1]["bytes"], reverse=True)
+    return [dict(name=name, **values) for name, values in ranked[:n]]
+
+
+def scan(shares=None, full=False, top_n=TOP, cache_path=CACHE_FILE,
+         history_path=HISTORY_FILE, workers=WORKERS, record_history=False):
+    """Scan the shares, update the cache (and the history if
+    record_history is set), and return a report with the top owners
+    and directories"""
+    shares = shares or SHARES
+    started = time.perf_counter()
+    cache = {} if full else load_json(cache_path, {})
+    dirs, listed = walk(shares, cache, workers)
+    save_json(cache_path, dirs)
+
+    report = aggregate(shares, dirs)
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if record_history:
+        append_history(history_path, {
+            "time": now,
+            "shares": report["shares"],
+            "owners": report["owners"],
+        })
+    return {
+        "time": now,
+        "shares": report["shares"],
+        "top_owners": top(report["owners"], top_n),
+        "top_dirs": top(report["dirs"], top_n),
+        "dirs": len(dirs),
+        "dirs_listed": listed,
+        "duration_s": round(time.perf_counter() - started, 2),
+    }
+
+
+def append_history(path, entry, limit=HISTORY_LIMIT):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    history = read_history(path)
+    if len(history) > limit * 2:
+        # Let the file grow to twice the limit so it is not rewritten on every scan
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(h) + "\n" for h in history[-limit:])
+
+
+def read_history(path=HISTORY_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def growth(days=7, history_path=HISTORY_FILE):
+    """Compare the latest scan with the last scan at least `days` ago
+    (or the oldest one) and return the change per owner and share"""
+    history = read_history(history_path)
+    if not history:
+        return {"since": None, "until": None, "owners": [], "shares": {}}
+    latest = history[-1]
+    cutoff = (datetime.datetime.strptime(latest["time"], "%Y-%m-%d %H:%M:%S")
+              - datetime.timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    baseline = history[0]
+    for entry in history:
+        if entry["time"] <= cutoff:
+            baseline = entry
+
+    def delta(new, old):
+        return {
+            name: {
+                "bytes": new.get(name, {}).get("bytes", 0) - old.get(name, {}).get("bytes", 0),
+                "files": new.get(name, {}).get("files", 0) - old.get(name, {}).get("files", 0),
+            }
+            for name in set(new) | set(old)
+        }
+
+    owners = delta(latest["owners"], baseline["owners"])
+    return {
+        "since": baseline["time"],
+        "until": latest["time"],
+        "owners": top(owners, len(owners)),
+        "shares": delta(latest["shares"], baseline["shares"]),
+    }
+
+
+def human(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NFS share usage")
+    parser.add_argument("--share", action="append",
+                        help="share to scan (repeatable, default: "
+                             + ", ".join(SHARES) + ")")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("scan", help="scan the shares and show top consumers")
+    p.add_argument("--top", type=int, default=TOP)
+    p.add_argument("--full", action="store_true", help="ignore the cache")
+    p = sub.add_parser("growth", help="show usage change per owner")
+    p.add_argument("--days", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.command == "scan":
+        report = scan(args.share, args.full, args.top, record_history=True)
+        for share, totals in report["shares"].items():
+            print(f"{share}: {human(totals['bytes'])} in {totals['files']} files")
+        print("\nTop owners:")
+        for entry in report["top_owners"]:
+            print(f"  {entry['name']:<16} {human(entry['bytes']):>10}  {entry['files']} files")
+        print("\nTop directories:")
+        for entry in report["top_dirs"]:
+            print(f"  {entry['name']:<40} {human(entry['bytes']):>10}  {entry['files']} files")
+        print(f"\n{report['dirs']} directories, {report['dirs_listed']} re-read, "
+              f"{report['duration_s']}s")
+    elif args.command == "growth":
+        report = growth(args.days)
+        if report["since"] is None:
+            print("No scans recorded yet. Run: python3 nfs_usage.py scan")
+            sys.exit(1)
+        print(f"Growth from {report['since']} to {report['until']}:")
+        for entry in report["owners"]:
+            sign = "-" if entry["bytes"] < 0 else "+"
+            print(f"  {entry['name']:<16} {sign + human(abs(entry['bytes'])):>11}  "
+                  f"{entry['files']:+d} files")
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
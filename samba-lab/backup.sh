@@ -3,9 +3,10 @@
 # Script Name: Samba Automatic Backup Setup
 # Description: Configures daily automatic backups for Samba shares
 #              /samba/anonymous and /home/secure. Backups are
-#              stored in /backup/samba/<date> and cron is used
+#              incremental, deduplicated snapshots stored in
+#              /backup/samba/snapshots/<timestamp> and cron is used
 #              to schedule daily execution. Idempotent.
-# Version: 0.0
+# Version: 0.2
 # Author: creme332
 #--------------------------------------------------------------
 
@@ -13,38 +14,35 @@ BACKUP_DIR="/backup/samba"
 ANONYMOUS_SHARE="/samba/anonymous"
 SECURE_SHARE="/home/secure"
 CRON_FILE="/etc/cron.daily/samba-backup"
+ENGINE="/usr/local/sbin/samba_snapshot.py"
+ENGINE_URL="https://raw.githubusercontent.com/creme332/centos-scripts/refs/heads/main/samba-lab/samba_snapshot.py"
 
 # --- Install packages ---
-yum install -y rsync cronie
+yum install -y cronie python3
 
 # --- Enable cron ---
 systemctl enable crond
 systemctl start crond
 
+# --- Install snapshot engine ---
+curl -s -o "$ENGINE" "$ENGINE_URL"
+chmod 0755 "$ENGINE"
+
 # --- Ensure backup directory exists ---
 mkdir -p "$BACKUP_DIR"
 chown root:root "$BACKUP_DIR"
 chmod 0755 "$BACKUP_DIR"
 
 # --- Create backup script ---
-cat <<'EOF' > "$CRON_FILE"
+# Snapshot both shares, keep the last 7 snapshots and delete file
+# contents that are no longer referenced by any snapshot.
+cat <<EOF > "$CRON_FILE"
 #!/bin/bash
-DATE=$(date +%F)
-BACKUP_DIR="/backup/samba/$DATE"
-
-mkdir -p "$BACKUP_DIR"
-
-# Backup anonymous share
-rsync -a --delete /samba/anonymous/ "$BACKUP_DIR/anonymous/"
-
-# Backup secure share
-rsync -a --delete /home/secure/ "$BACKUP_DIR/secure/"
-
-# Optional: keep last 7 backups only
-find /backup/samba/* -maxdepth 0 -type d -mtime +7 -exec rm -rf {} \;
+python3 $ENGINE --root $BACKUP_DIR backup --keep 7 \\
+    --share anonymous=$ANONYMOUS_SHARE --share secure=$SECURE_SHARE
 EOF
 
 chmod +x "$CRON_FILE"
 
 echo "Samba automatic backup script created at $CRON_FILE"
-echo "Backups will run daily via cron and stored under $BACKUP_DIR/<date>"
+echo "Backups will run daily via cron and stored under $BACKUP_DIR/snapshots/<timestamp>"
@@ -6,7 +6,7 @@
 #              share (Secure) using the vfs_recycle module. Ensures
 #              proper ownership and permissions. Designed to be
 #              idempotent and safe to run multiple times.
-# Version: 0.0
+# Version: 0.2
 # Author: creme332
 #--------------------------------------------------------------
 # Requirements:
@@ -19,16 +19,20 @@
 #   if not already present
 # - Sets up per-user recycle folders under /home/secure/.recycle/%U
 # - Preserves directory structure of deleted files (keeptree)
+# - Installs a daily cron job that cleans up the recycle bin
 #--------------------------------------------------------------
 # Notes:
-# - This setup does NOT include automatic cleanup of the recycle bin.
-#   Files will remain until manually deleted.
+# - A daily cron job runs recycle_reaper.py to delete files older
+#   than 30 days and keep each user's bin under 500 MB.
 # - Requires Samba service reload to apply configuration changes
 # - Assumes the 'Secure' share is already restricted to group 'smbgrp'
 #--------------------------------------------------------------
 
 SMB_CONF="/etc/samba/smb.conf"
 RECYCLE_DIR="/home/secure/.recycle"
+CRON_FILE="/etc/cron.daily/samba-recycle-reaper"
+REAPER="/usr/local/sbin/recycle_reaper.py"
+REAPER_URL="https://raw.githubusercontent.com/creme332/centos-scripts/refs/heads/main/samba-lab/recycle_reaper.py"
 
 # --- Ensure [Secure] share exists ---
 if ! grep -q "^\[Secure\]" "$SMB_CONF"; then
@@ -55,8 +59,23 @@ fi
 
 # --- Ensure recycle folder exists with proper ownership and permissions ---
 mkdir -p "$RECYCLE_DIR"
-chown -R rasho:smbgrp "$RECYCLE_DIR"
-chmod -R 0770 "$RECYCLE_DIR"
+# Not recursive: leave the files already in the bin untouched
+chown rasho:smbgrp "$RECYCLE_DIR"
+chmod 0770 "$RECYCLE_DIR"
+
+# --- Install recycle bin reaper ---
+yum install -y cronie python3
+curl -s -o "$REAPER" "$REAPER_URL"
+chmod 0755 "$REAPER"
+
+cat <<EOF > "$CRON_FILE"
+#!/bin/bash
+python3 $REAPER --recycle-dir $RECYCLE_DIR reap --max-age-days 30 --quota-mb 500
+EOF
+chmod +x "$CRON_FILE"
+systemctl enable crond
+systemctl start crond
+echo "Recycle Bin cleanup scheduled daily via $CRON_FILE"
 
 # --- Reload Samba to apply changes ---
 systemctl reload smb.service nmb.service
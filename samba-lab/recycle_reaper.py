@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Samba Recycle Bin Reaper
+
+Cleans up the per-user recycle bins created by recycle.sh under
+/home/secure/.recycle/<user>. Files older than a maximum age are
+deleted, then the oldest files are evicted until each user is back
+under their quota. Empty directories left behind are removed.
+
+Usage: python3 recycle_reaper.py scan
+       python3 recycle_reaper.py reap [--max-age-days N] [--quota-mb N] [--dry-run]
+Author: creme332
+
+Notes:
+- User trees are scanned in parallel with os.scandir.
+- An index of every directory (mtime, files, subdirectories) is kept
+  in INDEX_FILE. A directory whose mtime has not changed since the
+  last run is not listed again, so repeat runs only read the
+  subtrees where files were added or removed.
+- A file's atime is used as the time it was deleted. recycle.sh sets
+  recycle:touch = yes, so Samba updates the atime when it moves a file
+  into the recycle bin; the mtime is kept and the ctime also changes
+  whenever ownership or permissions are touched.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+RECYCLE_DIR = "/home/secure/.recycle"
+INDEX_FILE = "/var/lib/samba-recycle/index.json"
+MAX_AGE_DAYS = 30
+QUOTA_MB = 500
+WORKERS = 4
+
+
+def load_index(path=INDEX_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"users": {}}
+
+
+def save_index(index, path=INDEX_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # A unique tmp file, since the web UI may save from several threads
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, path)
+
+
+def scan_user(top, cached_dirs):
+    """Index every directory under top, reusing cached listings of
+    directories whose mtime has not changed.
+    Returns (dirs, stats) where dirs maps relpath -> entry."""
+    dirs = {}
+    stats = {"dirs": 0, "listed": 0}
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        path = os.path.join(top, rel)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        stats["dirs"] += 1
+        cached = cached_dirs.get(rel)
+        if cached and cached["mtime_ns"] == mtime_ns:
+            entry = cached
+        else:
+            entry = {"mtime_ns": mtime_ns, "files": {}, "subdirs": []}
+            try:
+                with os.scandir(path) as it:
+                    for child in it:
+                        if child.is_dir(follow_symlinks=False):
+                            entry["subdirs"].append(child.name)
+                        else:
+                            st = child.stat(follow_symlinks=False)
+                            entry["files"][child.name] = [st.st_size, st.st_atime]
+            except OSError as e:
+                print(f"[WARN] Cannot read {path}: {e}", file=sys.stderr)
+                continue
+            stats["listed"] += 1
+        dirs[rel] = entry
+        stack.extend(os.path.join(rel, name) for name in entry["subdirs"])
+    return dirs, stats
+
+
+def scan(recycle_dir=RECYCLE_DIR, index_path=INDEX_FILE, workers=WORKERS):
+    """Refresh the index for every user and return it"""
+    index = load_index(index_path)
+    old_users = index.get("users", {})
+    users = []
+    if os.path.isdir(recycle_dir):
+        with os.scandir(recycle_dir) as it:
+            users = sorted(e.name for e in it if e.is_dir(follow_symlinks=False))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            user: pool.submit(scan_user, os.path.join(recycle_dir, user),
+                              old_users.get(user, {}).get("dirs", {}))
+            for user in users
+        }
+        new_users = {}
+        for user, future in futures.items():
+            dirs, stats = future.result()
+            new_users[user] = {"dirs": dirs, "stats": stats}
+
+    index = {"users": new_users}
+    save_index(index, index_path)
+    return index
+
+
+def user_files(dirs):
+    """Return [(atime, size, relpath)] for every file, oldest first"""
+    files = [
+        (atime, size, os.path.join(rel, name))
+        for rel, entry in dirs.items()
+        for name, (size, atime) in entry["files"].items()
+    ]
+    files.sort()
+    return files
+
+
+def usage(index):
+    """Summarise bytes, file count and oldest entry per user"""
+    summary = {}
+    for user, data in index["users"].items():
+        files = user_files(data["dirs"])
+        summary[user] = {
+            "files": len(files),
+            "bytes": sum(size for _, size, _ in files),
+            "oldest": files[0][0] if files else None,
+            "dirs_listed": data.get("stats", {}).get("listed", 0),
+        }
+    return summary
+
+
+def remove_empty_dirs(top, evicted):
+    """Remove the parent directories of evicted files that are now
+    empty, deepest first. Other empty directories are left alone."""
+    parents = set()
+    for rel in evicted:
+        rel = os.path.dirname(rel)
+        while rel:
+            parents.add(rel)
+            rel = os.path.dirname(rel)
+    for rel in sorted(parents, key=lambda d: d.count(os.sep), reverse=True):
+        try:
+            os.rmdir(os.path.join(top, rel))
+        except OSError:
+            pass
+
+
+def reap(max_age_days=MAX_AGE_DAYS, quota_mb=QUOTA_MB, dry_run=False,
+         recycle_dir=RECYCLE_DIR, index_path=INDEX_FILE, now=None):
+    """Evict expired files, then the oldest files of any user over
+    quota. Returns a per-user report."""
+    now = now or time.time()
+    cutoff = now - max_age_days * 86400
+    quota = quota_mb * 1024 * 1024
+
+    index = scan(recycle_dir, index_path)
+    report = {}
+    for user, data in index["users"].items():
+        files = user_files(data["dirs"])
+        total = sum(size for _, size, _ in files)
+        evicted = []
+        for atime, size, rel in files:
+            if atime >= cutoff and total <= quota:
+                break
+            evicted.append(rel)
+            total -= size
+            if not dry_run:
+                try:
+                    os.remove(os.path.join(recycle_dir, user, rel))
+                except OSError as e:
+                    print(f"[WARN] Cannot remove {rel}: {e}", file=sys.stderr)
+
+        if evicted and not dry_run:
+            top = os.path.join(recycle_dir, user)
+            remove_empty_dirs(top, evicted)
+        report[user] = {
+            "evicted": len(evicted),
+            "remaining_bytes": total,
+            "files": evicted if dry_run else [],
+        }
+
+    if not dry_run and any(r["evicted"] for r in report.values()):
+        # Record the post-eviction state so the next run stays incremental
+        scan(recycle_dir, index_path)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Samba recycle bin reaper")
+    parser.add_argument("--recycle-dir", default=RECYCLE_DIR)
+    parser.add_argument("--index", default=INDEX_FILE)
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("scan", help="show recycle bin usage per user")
+    reaper = sub.add_parser("reap", help="evict expired and over-quota files")
+    reaper.add_argument("--max-age-days", type=int, default=MAX_AGE_DAYS)
+    reaper.add_argument("--quota-mb", type=int, default=QUOTA_MB)
+    reaper.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "scan":
+        index = scan(args.recycle_dir, args.index)
+        for user, info in usage(index).items():
+            print(f"{user}: {info['files']} files, {info['bytes']} bytes "
+                  f"({info['dirs_listed']} directories re-read)")
+    elif args.command == "reap":
+        report = reap(args.max_age_days, args.quota_mb, args.dry_run,
+                      args.recycle_dir, args.index)
+        for user, info in report.items():
+            action = "would evict" if args.dry_run else "evicted"
+            print(f"{user}: {action} {info['evicted']} files, "
+                  f"{info['remaining_bytes']} bytes remaining")
+            for rel in info["files"]:
+                print(f"  {rel}")
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Samba Snapshot Backup
+
+Incremental, deduplicating backups of the Samba shares. Every file
+is stored once under <root>/objects/ keyed by its SHA-256 and each
+snapshot under <root>/snapshots/<name>/ is a browsable tree of
+hardlinks into that store, so a nightly run only copies files that
+changed since the previous snapshot.
+
+Usage: python3 samba_snapshot.py backup [--keep N] [--share NAME=PATH]
+       python3 samba_snapshot.py list
+       python3 samba_snapshot.py gc [--keep N]
+       python3 samba_snapshot.py restore SNAPSHOT SHARE DEST [--path REL]
+Author: creme332
+
+Notes:
+- Unchanged files (same size and mtime as in the previous snapshot)
+  are linked without being read or hashed.
+- Changed files are copied into the store in parallel by a thread
+  pool and hashed while they are copied, so an object's name always
+  matches the bytes it holds.
+- Runs take an exclusive lock on <root>/.lock, so a backup and a
+  garbage collection never overlap.
+- Retention keeps the newest N snapshots; objects that are no longer
+  linked from any snapshot are then removed by the garbage collector.
+- Original ownership, mode and mtime of files and directories, and
+  symlink targets, are recorded in each snapshot's manifest.json; the
+  linked files themselves are read-only copies owned by root. Use
+  restore to copy a share (or part of it) back with its metadata.
+- A file whose object has reached the filesystem's hardlink limit is
+  copied into the snapshot instead of linked.
+"""
+
+import argparse
+import contextlib
+import datetime
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+BACKUP_ROOT = "/backup/samba"
+SHARES = {
+    "anonymous": "/samba/anonymous",
+    "secure": "/home/secure",
+}
+KEEP = 7
+WORKERS = 4
+CHUNK_SIZE = 1024 * 1024
+MANIFEST = "manifest.json"
+
+
+def objects_dir(root=BACKUP_ROOT):
+    return os.path.join(root, "objects")
+
+
+def snapshots_dir(root=BACKUP_ROOT):
+    return os.path.join(root, "snapshots")
+
+
+def object_path(digest, root=BACKUP_ROOT):
+    return os.path.join(objects_dir(root), digest[:2], digest[2:])
+
+
+@contextlib.contextmanager
+def locked(root=BACKUP_ROOT):
+    """Hold an exclusive lock on the backup root"""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def walk_share(top):
+    """Yield (relpath, stat) for top itself ('') and every directory,
+    regular file and symlink under it"""
+    yield "", os.stat(top)
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            entries = list(os.scandir(os.path.join(top, rel_dir)))
+        except OSError as e:
+            print(f"[WARN] Cannot read {os.path.join(top, rel_dir)}: {e}",
+                  file=sys.stderr)
+            continue
+        for entry in entries:
+            rel = os.path.join(rel_dir, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(rel)
+            elif not (entry.is_file(follow_symlinks=False) or entry.is_symlink()):
+                continue
+            yield rel, entry.stat(follow_symlinks=False)
+
+
+def list_snapshots(root=BACKUP_ROOT):
+    """Return completed snapshot names, oldest first"""
+    path = snapshots_dir(root)
+    if not os.path.isdir(path):
+        return []
+    return sorted(
+        name for name in os.listdir(path)
+        if not name.startswith(".")
+        and os.path.isfile(os.path.join(path, name, MANIFEST))
+    )
+
+
+def load_manifest(name, root=BACKUP_ROOT):
+    with open(os.path.join(snapshots_dir(root), name, MANIFEST), "r",
+              encoding="utf-8") as f:
+        return json.load(f)
+
+
+def snapshot_info(root=BACKUP_ROOT):
+    """Return a summary of every snapshot, newest first"""
+    info = []
+    for name in reversed(list_snapshots(root)):
+        try:
+            manifest = load_manifest(name, root)
+        except FileNotFoundError:
+            # Removed by a garbage collection running right now
+            continue
+        info.append({
+            "name": name,
+            "created": manifest.get("created"),
+            "files": sum(len(files)
+                         for files in manifest["shares"].values()),
+            "bytes": sum(meta["size"]
+                         for files in manifest["shares"].values()
+                         for meta in files.values()),
+            "new_bytes": manifest.get("stats", {}).get("new_bytes", 0),
+        })
+    return info
+
+
+def store_file(src, root=BACKUP_ROOT):
+    """Copy src into the object store, hashing the bytes as they are
+    written. Returns (digest, size, created); created is False if the
+    content was already stored."""
+    store = objects_dir(root)
+    os.makedirs(store, exist_ok=True)
+    sha = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=store)
+    try:
+        with open(src, "rb") as f, os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                sha.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        digest = sha.hexdigest()
+        dest = object_path(digest, root)
+        if os.path.exists(dest):
+            os.remove(tmp)
+            return digest, size, False
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.chmod(tmp, 0o400)
+        os.replace(tmp, dest)
+        return digest, size, True
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def link_object(digest, dest, root=BACKUP_ROOT):
+    """Hardlink an object into a snapshot, or copy it if the object
+    already has as many links as the filesystem allows"""
+    try:
+        os.link(object_path(digest, root), dest)
+    except OSError as e:
+        if e.errno != errno.EMLINK:
+            raise
+        shutil.copyfile(object_path(digest, root), dest)
+        os.chmod(dest, 0o400)
+
+
+def create_snapshot(shares=None, root=BACKUP_ROOT, workers=WORKERS):
+    """Take a new snapshot of the shares and return its stats"""
+    with locked(root):
+        return _create_snapshot(shares or SHARES, root, workers)
+
+
+def _create_snapshot(shares, root, workers):
+    now = datetime.datetime.now()
+    name = now.strftime("%Y-%m-%dT%H%M%S.%f")
+
+    previous = list_snapshots(root)
+    prev_shares = load_manifest(previous[-1], root)["shares"] if previous else {}
+
+    stage = os.path.join(snapshots_dir(root), f".tmp-{name}")
+    os.makedirs(stage)
+
+    stats = {"files": 0, "hashed": 0, "new_objects": 0, "new_bytes": 0}
+    manifest = {"created": now.strftime("%Y-%m-%d %H:%M:%S"), "shares": {},
+                "dirs": {}, "links": {}}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for share, top in shares.items():
+            if not os.path.isdir(top):
+                print(f"[WARN] Share {top} not found, skipping.", file=sys.stderr)
+                continue
+            old = prev_shares.get(share, {})
+            files = {}
+            dirs = {}
+            links = {}
+            pending = {}
+            for rel, st in walk_share(top):
+                owner = {"uid": st.st_uid, "gid": st.st_gid}
+                if stat.S_ISDIR(st.st_mode):
+                    dirs[rel] = dict(owner, mode=st.st_mode & 0o7777,
+                                     mtime_ns=st.st_mtime_ns)
+                    continue
+                if stat.S_ISLNK(st.st_mode):
+                    try:
+                        links[rel] = dict(owner, target=os.readlink(os.path.join(top, rel)))
+                    except OSError as e:
+                        print(f"[WARN] Cannot read {os.path.join(top, rel)}: {e}",
+                              file=sys.stderr)
+                    continue
+                meta = {
+                    "size": st.st_size,
+                    "mtime_ns": st.st_mtime_ns,
+                    "mode": st.st_mode & 0o7777,
+                    "uid": st.st_uid,
+                    "gid": st.st_gid,
+                }
+                prev = old.get(rel)
+                if (prev and prev["size"] == st.st_size
+                        and prev["mtime_ns"] == st.st_mtime_ns
+                        and os.path.exists(object_path(prev["sha256"], root))):
+                    meta["sha256"] = prev["sha256"]
+                else:
+                    pending[rel] = pool.submit(store_file, os.path.join(top, rel), root)
+                files[rel] = meta
+
+            for rel, future in pending.items():
+                try:
+                    digest, size, created = future.result()
+                except OSError as e:
+                    print(f"[WARN] Cannot read {os.path.join(top, rel)}: {e}",
+                          file=sys.stderr)
+                    del files[rel]
+                    continue
+                # The size of what was copied, in case the file changed since the walk
+                files[rel]["sha256"] = digest
+                files[rel]["size"] = size
+                stats["hashed"] += 1
+                if created:
+                    stats["new_objects"] += 1
+                    stats["new_bytes"] += size
+
+            for rel in dirs:
+                os.makedirs(os.path.join(stage, share, rel), exist_ok=True)
+            for rel, meta in files.items():
+                dest = os.path.join(stage, share, rel)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                link_object(meta["sha256"], dest, root)
+            for rel, meta in links.items():
+                dest = os.path.join(stage, share, rel)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                os.symlink(meta["target"], dest)
+
+            stats["files"] += len(files)
+            manifest["shares"][share] = files
+            manifest["dirs"][share] = dirs
+            manifest["links"][share] = links
+
+    manifest["stats"] = stats
+    with open(os.path.join(stage, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.rename(stage, os.path.join(snapshots_dir(root), name))
+
+    stats["name"] = name
+    return stats
+
+
+def collect_garbage(keep=KEEP, root=BACKUP_ROOT):
+    """Drop all but the newest `keep` snapshots, then delete objects
+    no snapshot links to any more"""
+    with locked(root):
+        return _collect_garbage(keep, root)
+
+
+def _collect_garbage(keep, root):
+    removed_snapshots = []
+    snaps_path = snapshots_dir(root)
+    if os.path.isdir(snaps_path):
+        # Leftovers from interrupted runs
+        for name in os.listdir(snaps_path):
+            if name.startswith(".tmp-"):
+                shutil.rmtree(os.path.join(snaps_path, name), ignore_errors=True)
+    snapshots = list_snapshots(root)
+    for name in snapshots[:max(len(snapshots) - keep, 0)]:
+        shutil.rmtree(os.path.join(snaps_path, name))
+        removed_snapshots.append(name)
+
+    # An object linked only from the store itself has st_nlink == 1
+    removed_objects = 0
+    freed_bytes = 0
+    store = objects_dir(root)
+    if os.path.isdir(store):
+        for bucket in os.scandir(store):
+            if bucket.name.startswith(".tmp-"):
+                # Copy left behind by an interrupted run
+                os.remove(bucket.path)
+                continue
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                st = entry.stat(follow_symlinks=False)
+                if st.st_nlink <= 1:
+                    os.remove(entry.path)
+                    removed_objects += 1
+                    freed_bytes += st.st_size
+
+    return {
+        "removed_snapshots": removed_snapshots,
+        "removed_objects": removed_objects,
+        "freed_bytes": freed_bytes,
+    }
+
+
+def restore_snapshot(name, share, dest, path="", root=BACKUP_ROOT):
+    """Copy a share (or the subtree at path) out of a snapshot into
+    dest with its original ownership, modes and mtimes. Returns the
+    number of files, directories and symlinks restored."""
+    manifest = load_manifest(name, root)
+    if share not in manifest["shares"]:
+        raise ValueError(f"Snapshot {name} has no share {share}")
+    src_top = os.path.join(snapshots_dir(root), name, share)
+    prefix = path.strip("/")
+
+    def wanted(rel):
+        return not prefix or rel == prefix or rel.startswith(prefix + "/")
+
+    def apply_owner(target, meta, follow=True):
+        os.chown(target, meta["uid"], meta["gid"], follow_symlinks=follow)
+
+    dirs = {rel: meta for rel, meta in manifest.get("dirs", {}).get(share, {}).items()
+            if wanted(rel)}
+    files = {rel: meta for rel, meta in manifest["shares"][share].items()
+             if wanted(rel)}
+    links = {rel: meta for rel, meta in manifest.get("links", {}).get(share, {}).items()
+             if wanted(rel)}
+
+    for rel in dirs:
+        os.makedirs(os.path.join(dest, rel), exist_ok=True)
+    for rel, meta in files.items():
+        target = os.path.join(dest, rel)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.islink(target):
+            os.remove(target)
+        shutil.copyfile(os.path.join(src_top, rel), target)
+        apply_owner(target, meta)
+        os.chmod(target, meta["mode"])
+        os.utime(target, ns=(meta["mtime_ns"], meta["mtime_ns"]))
+    for rel, meta in links.items():
+        target = os.path.join(dest, rel)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.lexists(target):
+            os.remove(target)
+        os.symlink(meta["target"], target)
+        apply_owner(target, meta, follow=False)
+    # Deepest first, so restoring a directory's mtime is not undone by
+    # creating entries inside it
+    for rel in sorted(dirs, key=lambda d: d.count("/"), reverse=True):
+        target = os.path.join(dest, rel)
+        meta = dirs[rel]
+        apply_owner(target, meta)
+        os.chmod(target, meta["mode"])
+        os.utime(target, ns=(meta["mtime_ns"], meta["mtime_ns"]))
+
+    return {"files": len(files), "dirs": len(dirs), "links": len(links)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Samba snapshot backups")
+    parser.add_argument("--root", default=BACKUP_ROOT,
+                        help=f"backup root (default: {BACKUP_ROOT})")
+    sub = parser.add_subparsers(dest="command")
+    backup = sub.add_parser("backup", help="take a snapshot, then run gc")
+    backup.add_argument("--keep", type=int, default=KEEP)
+    backup.add_argument("--workers", type=int, default=WORKERS)
+    backup.add_argument("--share", action="append", metavar="NAME=PATH",
+                        help="share to back up (repeatable, default: "
+                             + ", ".join(f"{k}={v}" for k, v in SHARES.items()) + ")")
+    gc = sub.add_parser("gc", help="apply retention and delete unused objects")
+    gc.add_argument("--keep", type=int, default=KEEP)
+    sub.add_parser("list", help="list snapshots")
+    restore = sub.add_parser("restore", help="copy a share out of a snapshot")
+    restore.add_argument("snapshot")
+    restore.add_argument("share")
+    restore.add_argument("dest")
+    restore.add_argument("--path", default="",
+                         help="only restore this file or directory (relative to the share)")
+    args = parser.parse_args()
+
+    if args.command == "backup":
+        shares = None
+        if args.share:
+            if not all("=" in item for item in args.share):
+                parser.error("--share must be NAME=PATH")
+            shares = dict(item.split("=", 1) for item in args.share)
+        stats = create_snapshot(shares, root=args.root, workers=args.workers)
+        print(f"Snapshot {stats['name']}: {stats['files']} files, "
+              f"{stats['hashed']} hashed, {stats['new_objects']} new objects "
+              f"({stats['new_bytes']} bytes)")
+        result = collect_garbage(keep=args.keep, root=args.root)
+        print(f"GC: removed {len(result['removed_snapshots'])} snapshots, "
+              f"{result['removed_objects']} objects ({result['freed_bytes']} bytes)")
+    elif args.command == "gc":
+        result = collect_garbage(keep=args.keep, root=args.root)
+        print(f"GC: removed {len(result['removed_snapshots'])} snapshots, "
+              f"{result['removed_objects']} objects ({result['freed_bytes']} bytes)")
+    elif args.command == "list":
+        for snap in snapshot_info(args.root):
+            print(f"{snap['name']}  {snap['files']} files  {snap['bytes']} bytes  "
+                  f"(+{snap['new_bytes']} new)")
+    elif args.command == "restore":
+        try:
+            counts = restore_snapshot(args.snapshot, args.share, args.dest,
+                                      args.path, args.root)
+        except (ValueError, FileNotFoundError) as e:
+            print(f"[ERROR] {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Restored {counts['files']} files, {counts['dirs']} directories "
+              f"and {counts['links']} symlinks to {args.dest}")
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
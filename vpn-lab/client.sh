@@ -4,7 +4,7 @@
 # Script Name: OpenVPN Client Setup for CentOS 7
 # Description: Minimal setup - installs packages only
 # Usage: bash client.sh
-# Version: 1.1
+# Version: 1.2
 # Author: creme332
 #--------------------------------------------------------------
 
@@ -20,7 +20,7 @@ install_packages() {
     fi
     
     # Install OpenVPN and utilities
-    yum install -y openvpn curl traceroute bind-utils openssh-clients
+    yum install -y openvpn curl traceroute bind-utils openssh-clients python3
     
     echo "[OK] Packages installed"
 }
@@ -53,5 +53,7 @@ install_packages
 # Download the verification script and give permission
 curl -o /usr/local/bin/vpn-verify https://raw.githubusercontent.com/creme332/centos-scripts/refs/heads/main/vpn-lab/vpn-verify
 chmod +x /usr/local/bin/vpn-verify
+curl -o /usr/local/bin/vpn_verify.py https://raw.githubusercontent.com/creme332/centos-scripts/refs/heads/main/vpn-lab/vpn_verify.py
+chmod +x /usr/local/bin/vpn_verify.py
 
 echo "[SUCCESS] OpenVPN client setup complete"
\ No newline at end of file
@@ -9,8 +9,10 @@
 #              Also generates client certificates and creates
 #              client configuration files.
 #              Idempotent and safe to re-run multiple times.
+#              Revisions of server.conf are kept in the config
+#              snapshot store (helper/config_store.py).
 # Usage: Run the script as root using bash server.sh [client_name]
-# Version: 0.7
+# Version: 0.8
 # Author: creme332
 #--------------------------------------------------------------
 # Requirements:
@@ -149,7 +151,7 @@ fi
 # --- Install packages ---
 echo "[INFO] Installing required packages..."
 yum install -y epel-release
-yum install -y openvpn easy-rsa iptables-services net-tools curl
+yum install -y openvpn easy-rsa iptables-services net-tools curl python3
 
 # --- Get server IP ---
 get_server_ip
@@ -175,8 +177,22 @@ OVPN_DIR="/etc/openvpn/server"
 EASYRSA_DIR="/etc/openvpn/easy-rsa"
 mkdir -p "$OVPN_DIR"
 
+# --- Config snapshot store ---
+CONFIG_STORE="/usr/local/sbin/config_store.py"
+CONFIG_STORE_URL="https://raw.githubusercontent.com/creme332/centos-scripts/refs/heads/main/helper/config_store.py"
+if [[ ! -f "$CONFIG_STORE" ]]; then
+    curl -fsS -o "$CONFIG_STORE" "$CONFIG_STORE_URL" || true
+fi
+
+record_config() {
+    if [[ -f "$1" && -f "$CONFIG_STORE" ]]; then
+        python3 "$CONFIG_STORE" record "$1" || echo "[WARN] Could not record $1 in config store"
+    fi
+}
+
 # --- Create server.conf ---
 SERVER_CONF="$OVPN_DIR/server.conf"
+record_config "$SERVER_CONF"
 cat > $SERVER_CONF <<'EOF'
 port 1194
 proto udp
@@ -201,6 +217,7 @@ status openvpn-status.log
 verb 3
 explicit-exit-notify 1
 EOF
+record_config "$SERVER_CONF"
 
 # --- EasyRSA setup ---
 if [[ ! -d $EASYRSA_DIR/pki ]]; then
@@ -1,38 +1,183 @@
 #!/usr/bin/env python3
 
 import os
+import sys
+import json
+import time
+import threading
+import functools
+import contextlib
 import subprocess
-from urllib.parse import parse_qs
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from collections import Counter, deque
+from urllib.parse import parse_qs, urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import datetime
 
+# Optional lab modules, enabled when downloaded next to server.py
+try:
+    import samba_snapshot
+except ImportError:
+    samba_snapshot = None
+
+try:
+    import recycle_reaper
+except ImportError:
+    recycle_reaper = None
+
+try:
+    import config_store
+except ImportError:
+    config_store = None
+
+try:
+    import lease_monitor
+    LEASES = lease_monitor.LeaseMonitor()
+except ImportError:
+    lease_monitor = None
+
+try:
+    import nfs_usage
+except ImportError:
+    nfs_usage = None
+
 CLIENTS_DIR = "/etc/openvpn/clients"
 SERVER_SCRIPT = os.path.expanduser("~/server.sh")
 PORT = 8080
 
+# Debugging aids, both off by default:
+#   VPN_UI_PROFILE=1   enables GET /debug/profile?seconds=N
+#   VPN_UI_SLOW_MS=500 logs per-phase timings of requests slower than 500 ms
+PROFILE_ENABLED = os.environ.get("VPN_UI_PROFILE") == "1"
+SLOW_REQUEST_MS = (float(os.environ["VPN_UI_SLOW_MS"])
+                   if os.environ.get("VPN_UI_SLOW_MS") else None)
+PROFILE_MAX_SECONDS = 60
+PROFILE_INTERVAL = 0.005
+
+# Each request runs in its own thread so the profiler can sample the
+# others; client create/delete are still handled one at a time. The lab
+# jobs have their own locks (samba_snapshot also holds a flock), so a
+# long reap or snapshot does not hold up client management.
+STATE_LOCK = threading.Lock()
+RECYCLE_LOCK = threading.Lock()
+CONFIG_LOCK = threading.Lock()
+PROFILE_LOCK = threading.Lock()
+SLOW_REQUESTS = deque(maxlen=100)
+NO_PHASE = contextlib.nullcontext()
+
+
+class PhaseTimer:
+    """Accumulate time per request phase. Entering a nested phase
+    pauses the enclosing one, so phase times add up to the total."""
+
+    def __init__(self):
+        self.start = self.mark = time.perf_counter()
+        self.phases = {}
+        self.stack = []
+
+    def switch(self):
+        now = time.perf_counter()
+        if self.stack:
+            name = self.stack[-1]
+            self.phases[name] = self.phases.get(name, 0.0) + now - self.mark
+        self.mark = now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self.switch()
+        self.stack.append(name)
+        try:
+            yield
+        finally:
+            self.switch()
+            self.stack.pop()
+
+    def report(self):
+        total = (time.perf_counter() - self.start) * 1000
+        phases = {name: round(t * 1000, 2) for name, t in self.phases.items()}
+        phases["other"] = round(total - sum(phases.values()), 2)
+        return round(total, 2), phases
+
+
+def traced(handler):
+    """Time a do_* method and log it if slower than SLOW_REQUEST_MS"""
+    @functools.wraps(handler)
+    def wrapper(self):
+        if SLOW_REQUEST_MS is None or self.path.startswith("/debug/"):
+            return handler(self)
+        self.timer = PhaseTimer()
+        try:
+            return handler(self)
+        finally:
+            total, phases = self.timer.report()
+            self.timer = None
+            if total >= SLOW_REQUEST_MS:
+                entry = {
+                    "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "method": self.command,
+                    "path": self.path,
+                    "total_ms": total,
+                    "phases": phases,
+                }
+                SLOW_REQUESTS.append(entry)
+                self.log_message("slow request %.1f ms: %s %s %s", total,
+                                 self.command, self.path,
+                                 " ".join(f"{k}={v}" for k, v in phases.items()))
+    return wrapper
+
+
+def sample_stacks(seconds, interval=PROFILE_INTERVAL):
+    """Sample the stacks of the request threads and return a Counter of
+    collapsed stacks ('outer;...;inner'), as used by flamegraph.pl"""
+    # The main thread only waits in serve_forever(), so leave it out too
+    skip = {threading.get_ident(), threading.main_thread().ident}
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident in skip:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} "
+                             f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            # No thread name: every request thread gets a new one, which
+            # would stop identical stacks from merging
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
 
 class VPNClientManager(BaseHTTPRequestHandler):
+    timer = None
+
+    def phase(self, name):
+        """Context manager timing a phase of the current request"""
+        return self.timer.phase(name) if self.timer else NO_PHASE
+
     def list_clients(self):
-        if os.path.isdir(CLIENTS_DIR):
-            clients = []
-            for filename in os.listdir(CLIENTS_DIR):
-                filepath = os.path.join(CLIENTS_DIR, filename)
-                if os.path.isfile(filepath):
-                    stat = os.stat(filepath)
-                    created = datetime.datetime.fromtimestamp(stat.st_ctime)
-                    clients.append({
-                        'name': filename,
-                        'created': created.strftime('%Y-%m-%d %H:%M'),
-                        'size': stat.st_size
-                    })
-            return sorted(clients, key=lambda x: x['name'])
-        return []
+        with self.phase("fs"):
+            if os.path.isdir(CLIENTS_DIR):
+                clients = []
+                for filename in os.listdir(CLIENTS_DIR):
+                    filepath = os.path.join(CLIENTS_DIR, filename)
+                    if os.path.isfile(filepath):
+                        stat = os.stat(filepath)
+                        created = datetime.datetime.fromtimestamp(stat.st_ctime)
+                        clients.append({
+                            'name': filename,
+                            'created': created.strftime('%Y-%m-%d %H:%M'),
+                            'size': stat.st_size
+                        })
+                return sorted(clients, key=lambda x: x['name'])
+            return []
 
     def get_certificate_content(self, client_name):
         """Read and return the certificate file content"""
         filepath = os.path.join(CLIENTS_DIR, client_name)
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
+            with self.phase("fs"), open(filepath, 'r', encoding='utf-8') as f:
                 return f.read()
         except Exception as e:
             return f"Error reading certificate: {str(e)}"
@@ -717,37 +862,232 @@ class VPNClientManager(BaseHTTPRequestHandler):
         """
         return html
 
+    def send_json(self, payload, status=200):
+        with self.phase("render"):
+            body = json.dumps(payload, indent=2).encode("utf-8")
+        self.send_body(body, "application/json", status)
+
+    def send_body(self, body, content_type, status=200):
+        with self.phase("write"):
+            self.send_response(status)
+            self.send_header("Content-type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def handle_debug(self):
+        """Serve /debug/profile and /debug/slow when enabled"""
+        url = urlparse(self.path)
+        if url.path == "/debug/profile" and PROFILE_ENABLED:
+            try:
+                seconds = float(parse_qs(url.query).get("seconds", ["5"])[0])
+            except ValueError:
+                return self.send_json({"error": "seconds must be a number"}, 400)
+            seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+            if not PROFILE_LOCK.acquire(blocking=False):
+                return self.send_json({"error": "A profile is already running"}, 409)
+            try:
+                counts = sample_stacks(seconds)
+            finally:
+                PROFILE_LOCK.release()
+            body = "".join(f"{stack} {count}\n"
+                           for stack, count in counts.most_common())
+            self.send_body(body.encode("utf-8"), "text/plain; charset=utf-8")
+        elif url.path == "/debug/slow" and SLOW_REQUEST_MS is not None:
+            self.send_json(list(SLOW_REQUESTS))
+        else:
+            self.send_json({"error": "Debugging is not enabled"}, 404)
+
+    def module_missing(self, name):
+        self.send_json(
+            {"error": f"{name}.py is not installed next to server.py"}, 404)
+
+    def handle_api_get(self):
+        """Serve read-only JSON endpoints"""
+        url = urlparse(self.path)
+        if url.path == "/api/samba/snapshots":
+            if samba_snapshot is None:
+                return self.module_missing("samba_snapshot")
+            self.send_json(samba_snapshot.snapshot_info())
+        elif url.path == "/api/samba/recycle":
+            if recycle_reaper is None:
+                return self.module_missing("recycle_reaper")
+            self.send_json(recycle_reaper.usage(recycle_reaper.scan()))
+        elif url.path in ("/api/dhcp/leases", "/api/dhcp/lease"):
+            if lease_monitor is None:
+                return self.module_missing("lease_monitor")
+            # Only reads lease records appended since the last request
+            LEASES.refresh()
+            if url.path == "/api/dhcp/leases":
+                summary = LEASES.summary()
+                summary["active_leases"] = LEASES.active_leases()
+                self.send_json(summary)
+            else:
+                key = parse_qs(url.query).get("key", [""])[0]
+                lease = LEASES.lookup(key)
+                if lease is None:
+                    self.send_json({"error": f"No lease found for {key}"}, 404)
+                else:
+                    self.send_json(lease)
+        elif url.path in ("/api/nfs/usage", "/api/nfs/growth"):
+            if nfs_usage is None:
+                return self.module_missing("nfs_usage")
+            query = parse_qs(url.query)
+            try:
+                if url.path == "/api/nfs/usage":
+                    self.send_json(nfs_usage.scan(
+                        full=query.get("full", ["0"])[0] == "1",
+                        top_n=int(query.get("top", [nfs_usage.TOP])[0])))
+                else:
+                    self.send_json(nfs_usage.growth(
+                        days=int(query.get("days", ["7"])[0])))
+            except ValueError as e:
+                self.send_json({"error": str(e)}, 400)
+            except OSError as e:
+                self.send_json({"error": str(e)}, 500)
+        elif url.path.startswith("/api/config"):
+            if config_store is None:
+                return self.module_missing("config_store")
+            self.handle_config_get(url.path, parse_qs(url.query))
+        else:
+            self.send_json({"error": "Unknown endpoint"}, 404)
+
+    def handle_config_get(self, path, query):
+        """Serve the config snapshot store: list, log, show and diff"""
+        target = query.get("path", [""])[0]
+        try:
+            if path == "/api/config":
+                self.send_json(config_store.tracked())
+            elif path == "/api/config/log":
+                self.send_json(config_store.log(target))
+            elif path == "/api/config/show":
+                rev = int(query["rev"][0]) if "rev" in query else None
+                content = config_store.read(target, rev)
+                self.send_json({"path": target, "rev": rev,
+                                "content": content.decode("utf-8", "replace")})
+            elif path == "/api/config/diff":
+                rev_a = int(query["from"][0]) if "from" in query else None
+                rev_b = int(query["to"][0]) if "to" in query else None
+                self.send_json({"path": target,
+                                "diff": config_store.diff(target, rev_a, rev_b)})
+            else:
+                self.send_json({"error": "Unknown endpoint"}, 404)
+        except ValueError as e:
+            self.send_json({"error": str(e)}, 400)
+        except config_store.StoreError as e:
+            self.send_json({"error": str(e)}, 404)
+
+    def handle_api_post(self):
+        """Serve JSON endpoints that trigger an action"""
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/api/samba/snapshots":
+            if samba_snapshot is None:
+                return self.module_missing("samba_snapshot")
+            try:
+                keep = int(query.get("keep", [samba_snapshot.KEEP])[0])
+                stats = samba_snapshot.create_snapshot()
+                stats["gc"] = samba_snapshot.collect_garbage(keep=keep)
+                self.send_json(stats)
+            except (OSError, ValueError) as e:
+                self.send_json({"error": str(e)}, 500)
+        elif url.path == "/api/samba/recycle":
+            if recycle_reaper is None:
+                return self.module_missing("recycle_reaper")
+            try:
+                max_age_days = int(query.get(
+                    "max_age_days", [recycle_reaper.MAX_AGE_DAYS])[0])
+                quota_mb = int(query.get("quota_mb", [recycle_reaper.QUOTA_MB])[0])
+                with RECYCLE_LOCK:
+                    report = recycle_reaper.reap(
+                        max_age_days=max_age_days, quota_mb=quota_mb,
+                        dry_run=query.get("dry_run", ["0"])[0] == "1")
+                self.send_json(report)
+            except (OSError, ValueError) as e:
+                self.send_json({"error": str(e)}, 500)
+        elif url.path in ("/api/config/record", "/api/config/restore"):
+            if config_store is None:
+                return self.module_missing("config_store")
+            target = query.get("path", [""])[0]
+            try:
+                # Only files already tracked by the store can be touched
+                # from the UI; new files are added with the CLI
+                config_store.get_revision(target)
+                if url.path == "/api/config/record":
+                    with CONFIG_LOCK:
+                        revision, created = config_store.record(target)
+                    self.send_json({"revision": revision, "created": created})
+                else:
+                    rev = int(query["rev"][0])
+                    with CONFIG_LOCK:
+                        revision = config_store.restore(target, rev)
+                    self.send_json({"revision": revision})
+            except (KeyError, ValueError) as e:
+                self.send_json({"error": f"Invalid parameter: {e}"}, 400)
+            except config_store.StoreError as e:
+                self.send_json({"error": str(e)}, 404)
+            except OSError as e:
+                self.send_json({"error": str(e)}, 500)
+        else:
+            self.send_json({"error": "Unknown endpoint"}, 404)
+
+    @traced
     def do_GET(self):
-        if self.path.startswith('/view?client='):
+        if self.path.startswith('/debug/'):
+            self.handle_debug()
+        elif self.path.startswith('/api/'):
+            # No STATE_LOCK, so long scans do not hold up create/delete.
+            # Not read-only: the recycle and NFS scans rewrite their index
+            # and cache files (through unique tmp files) and LEASES
+            # refreshes under its own lock.
+            with self.phase("fs"):
+                self.handle_api_get()
+        elif self.path.startswith('/view?client='):
             # Extract client name from query parameter
-            client_name = self.path.split('client=')[1]
+            with self.phase("parse"):
+                client_name = self.path.split('client=')[1]
             # Validate that the client exists
             client_path = os.path.join(CLIENTS_DIR, client_name)
-            if os.path.exists(client_path):
-                page = self.render_certificate_view(client_name)
-                self.send_response(200)
-                self.send_header("Content-type", "text/html")
-                self.end_headers()
-                self.wfile.write(page.encode("utf-8"))
+            with self.phase("fs"):
+                exists = os.path.exists(client_path)
+            if exists:
+                with self.phase("render"):
+                    page = self.render_certificate_view(client_name)
+                self.send_body(page.encode("utf-8"), "text/html")
             else:
                 # Client doesn't exist, redirect to main page
-                self.send_response(302)
-                self.send_header("Location", "/")
-                self.end_headers()
+                with self.phase("write"):
+                    self.send_response(302)
+                    self.send_header("Location", "/")
+                    self.end_headers()
         else:
             # Main page
-            page = self.render_page()
-            self.send_response(200)
-            self.send_header("Content-type", "text/html")
-            self.end_headers()
-            self.wfile.write(page.encode("utf-8"))
+            with self.phase("render"):
+                page = self.render_page()
+            self.send_body(page.encode("utf-8"), "text/html")
 
+    @traced
     def do_POST(self):
-        content_length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(content_length).decode()
-        data = parse_qs(body)
-        client_name = data.get("client_name", [""])[0].strip()
+        if self.path.startswith('/api/'):
+            with self.phase("fs"):
+                return self.handle_api_post()
 
+        with self.phase("parse"):
+            content_length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(content_length).decode()
+            data = parse_qs(body)
+            client_name = data.get("client_name", [""])[0].strip()
+
+        with STATE_LOCK:
+            message, message_type = self.handle_action(client_name)
+
+        # Redirect back to main page with message
+        with self.phase("render"):
+            page = self.render_page(message=message, message_type=message_type)
+        self.send_body(page.encode("utf-8"), "text/html")
+
+    def handle_action(self, client_name):
+        """Create or delete a client; returns (message, message_type)"""
         if self.path == "/create":
             if client_name:
                 # Validate client name
@@ -759,8 +1099,9 @@ class VPNClientManager(BaseHTTPRequestHandler):
                     message_type = "error"
                 else:
                     try:
-                        subprocess.run(
-                            ["bash", SERVER_SCRIPT, client_name], check=True)
+                        with self.phase("subprocess"):
+                            subprocess.run(
+                                ["bash", SERVER_SCRIPT, client_name], check=True)
                         message = f"✅ Client '{client_name}' created successfully!"
                         message_type = "success"
                     except subprocess.CalledProcessError as e:
@@ -774,7 +1115,8 @@ class VPNClientManager(BaseHTTPRequestHandler):
             target_file = os.path.join(CLIENTS_DIR, client_name)
             if os.path.exists(target_file):
                 try:
-                    os.remove(target_file)
+                    with self.phase("fs"):
+                        os.remove(target_file)
                     message = f"✅ Client '{client_name}' deleted successfully!"
                     message_type = "success"
                 except Exception as e:
@@ -788,20 +1130,20 @@ class VPNClientManager(BaseHTTPRequestHandler):
             message = "❌ Unknown action."
             message_type = "error"
 
-        # Redirect back to main page with message
-        page = self.render_page(message=message, message_type=message_type)
-        self.send_response(200)
-        self.send_header("Content-type", "text/html")
-        self.end_headers()
-        self.wfile.write(page.encode("utf-8"))
+        return message, message_type
 
 
 def run_server():
     server_address = ('', PORT)
-    httpd = HTTPServer(server_address, VPNClientManager)
+    httpd = ThreadingHTTPServer(server_address, VPNClientManager)
+    httpd.daemon_threads = True
     print(f"🚀 OpenVPN Client Manager running at http://localhost:{PORT}")
     print(f"📁 Managing clients in: {CLIENTS_DIR}")
     print(f"📜 Using server script: {SERVER_SCRIPT}")
+    if PROFILE_ENABLED:
+        print(f"🔥 Profiler enabled at http://localhost:{PORT}/debug/profile?seconds=5")
+    if SLOW_REQUEST_MS is not None:
+        print(f"🐢 Logging requests slower than {SLOW_REQUEST_MS:g} ms")
     httpd.serve_forever()
 
 
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+VPN Verify (parallel)
+
+Checks that the OpenVPN client connection works, like vpn-verify, but
+runs the interface, routing, ping, DNS and traceroute probes
+concurrently against any number of targets, each with its own
+timeout. It can also measure latency and throughput through tun0
+against a peer running `vpn_verify.py serve`.
+
+Usage: python3 vpn_verify.py [TARGET...] [--peer 10.8.0.1] [--json] [--append FILE]
+       python3 vpn_verify.py serve [--host 10.8.0.1] [--port 5201]
+Example: python3 vpn_verify.py 8.8.8.8 1.1.1.1 --peer 10.8.0.1 --json
+Author: creme332
+
+Notes:
+- Exit status is 0 when every probe passes, 1 otherwise.
+- The peer latency and throughput test runs after the other probes
+  have finished, so it does not skew their numbers (or they its).
+- --json prints a machine-readable report; --append adds the report
+  as one JSON line to FILE so results can be collected over time.
+- serve listens on the VPN server's tunnel address (10.8.0.1) by
+  default, so the test port is only reachable through the VPN.
+- The peer must accept TCP on the test port from tun0, e.g. on the
+  VPN server: iptables -I INPUT -i tun0 -p tcp --dport 5201 -j ACCEPT
+"""
+
+import argparse
+import datetime
+import json
+import re
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+VPN_IF = "tun0"
+VPN_SUBNET = "10.8.0."
+VPN_DNS = ("8.8.8.8", "8.8.4.4")
+VPN_SERVER_IP = "10.8.0.1"
+DEFAULT_TARGETS = ["8.8.8.8", "1.1.1.1"]
+DNS_NAMES = ["google.com"]
+PEER_PORT = 5201
+TIMEOUT = 10
+WORKERS = 16
+ECHO_COUNT = 20
+SINK_MB = 8
+
+PRIVATE_RE = re.compile(r"^(192\.168\.|10\.|172\.(1[6-9]|2[0-9]|3[01])\.)")
+RTT_RE = re.compile(r"= ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+) ms")
+LOSS_RE = re.compile(r"([\d.]+)% packet loss")
+
+
+def run(cmd, timeout):
+    """Run a command, returning (returncode, stdout). A timeout or
+    missing binary is reported as returncode None."""
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT,
+                                universal_newlines=True, timeout=timeout)
+        return result.returncode, result.stdout
+    except subprocess.TimeoutExpired:
+        return None, f"timed out after {timeout}s"
+    except OSError as e:
+        return None, str(e)
+
+
+def result(probe, target, status, detail, **extra):
+    report = {"probe": probe, "target": target, "status": status, "detail": detail}
+    report.update(extra)
+    return report
+
+
+# --- Probes ---
+
+def probe_interface(timeout):
+    code, out = run(["ip", "-4", "-o", "addr", "show", VPN_IF], timeout)
+    match = re.search(r"inet ([\d.]+)", out or "")
+    if code != 0 or not match:
+        return result("interface", VPN_IF, "fail", f"{VPN_IF} is DOWN or not found")
+    vpn_ip = match.group(1)
+    if vpn_ip.startswith(VPN_SUBNET):
+        return result("interface", VPN_IF, "pass", f"{VPN_IF} is UP", vpn_ip=vpn_ip)
+    return result("interface", VPN_IF, "warn",
+                  f"{VPN_IF} has unexpected address {vpn_ip}", vpn_ip=vpn_ip)
+
+
+def probe_route(target, timeout):
+    code, out = run(["ip", "route", "get", target], timeout)
+    if code != 0:
+        return result("route", target, "fail", f"route lookup failed: {out.strip()}")
+    route = out.strip().splitlines()[0].strip() if out.strip() else ""
+    if f"dev {VPN_IF}" in route:
+        return result("route", target, "pass", f"uses {VPN_IF}", route=route)
+    return result("route", target, "warn", f"may NOT use {VPN_IF}", route=route)
+
+
+def probe_ping(target, timeout, count=3):
+    code, out = run(["ping", "-c", str(count), "-W", str(timeout), target],
+                    timeout * (count + 1))
+    loss = LOSS_RE.search(out or "")
+    rtt = RTT_RE.search(out or "")
+    extra = {
+        "loss_pct": float(loss.group(1)) if loss else 100.0,
+        "rtt_avg_ms": float(rtt.group(2)) if rtt else None,
+    }
+    if code == 0:
+        return result("ping", target, "pass", f"reachable ({count} packets)", **extra)
+    return result("ping", target, "fail", "unreachable", **extra)
+
+
+def probe_traceroute(target, timeout):
+    code, out = run(["traceroute", "-n", "-w", "3", "-q", "1", "-m", "8", target],
+                    timeout)
+    lines = (out or "").splitlines()
+    fields = lines[1].split() if code is not None and len(lines) > 1 else []
+    first_hop = fields[1] if len(fields) > 1 else None
+    if first_hop is None:
+        return result("traceroute", target, "fail",
+                      "could not determine first hop", first_hop=None)
+    if first_hop == "*":
+        return result("traceroute", target, "fail",
+                      "no reply from first hop", first_hop=None)
+    if first_hop.startswith(VPN_SUBNET):
+        return result("traceroute", target, "pass",
+                      "first hop is VPN gateway", first_hop=first_hop)
+    if PRIVATE_RE.match(first_hop):
+        return result("traceroute", target, "warn",
+                      "first hop is a private IP, traffic may bypass the VPN",
+                      first_hop=first_hop)
+    return result("traceroute", target, "warn",
+                  "first hop is a public IP", first_hop=first_hop)
+
+
+def probe_dns(name, timeout):
+    nameservers = []
+    try:
+        with open("/etc/resolv.conf", "r", encoding="utf-8") as f:
+            nameservers = [line.split()[1] for line in f
+                           if line.startswith("nameserver") and len(line.split()) > 1]
+    except OSError:
+        pass
+    code, out = run(["getent", "ahosts", name], timeout)
+    extra = {"nameservers": nameservers,
+             "vpn_pushed": any(ns in VPN_DNS for ns in nameservers)}
+    if code == 0 and out.strip():
+        return result("dns", name, "pass", "resolution working",
+                      address=out.split()[0], **extra)
+    return result("dns", name, "fail", "resolution failed", **extra)
+
+
+def probe_peer(peer, port, timeout, source=None):
+    """Measure echo latency and sink throughput to a `serve` peer"""
+    try:
+        with socket.create_connection((peer, port), timeout,
+                                      (source, 0) if source else None) as sock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # Latency: round trips of a small message
+            sock.sendall(b"E" + struct.pack("!I", ECHO_COUNT))
+            rtts = []
+            payload = b"x" * 64
+            for _ in range(ECHO_COUNT):
+                start = time.perf_counter()
+                sock.sendall(payload)
+                recv_exact(sock, len(payload))
+                rtts.append((time.perf_counter() - start) * 1000)
+
+            # Throughput: push SINK_MB and wait for the peer to confirm
+            size = SINK_MB * 1024 * 1024
+            chunk = b"\0" * 65536
+            start = time.perf_counter()
+            sock.sendall(b"S" + struct.pack("!Q", size))
+            sent = 0
+            while sent < size:
+                sock.sendall(chunk[:min(len(chunk), size - sent)])
+                sent += min(len(chunk), size - sent)
+            recv_exact(sock, 2)
+            elapsed = time.perf_counter() - start
+    except (OSError, ConnectionError) as e:
+        return result("peer", f"{peer}:{port}", "fail", f"peer test failed: {e}")
+
+    rtts.sort()
+    return result(
+        "peer", f"{peer}:{port}", "pass", "latency and throughput measured",
+        rtt_min_ms=round(rtts[0], 3),
+        rtt_avg_ms=round(sum(rtts) / len(rtts), 3),
+        rtt_p95_ms=round(rtts[int(len(rtts) * 0.95) - 1], 3),
+        throughput_mbps=round(size * 8 / elapsed / 1e6, 2),
+        bytes=size)
+
+
+def recv_exact(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed by peer")
+        data += chunk
+    return data
+
+
+# --- Peer server ---
+
+class PeerHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        try:
+            while True:
+                command = sock.recv(1)
+                if command == b"E":
+                    count = struct.unpack("!I", recv_exact(sock, 4))[0]
+                    for _ in range(count):
+                        sock.sendall(recv_exact(sock, 64))
+                elif command == b"S":
+                    remaining = struct.unpack("!Q", recv_exact(sock, 8))[0]
+                    while remaining:
+                        chunk = sock.recv(min(remaining, 65536))
+                        if not chunk:
+                            return
+                        remaining -= len(chunk)
+                    sock.sendall(b"OK")
+                else:
+                    return
+        except (OSError, ConnectionError):
+            return
+
+
+class PeerServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def serve(host, port):
+    with PeerServer((host, port), PeerHandler) as server:
+        print(f"VPN verify peer listening on {host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+# --- Report ---
+
+def verify(targets, dns_names=DNS_NAMES, peer=None, port=PEER_PORT,
+           timeout=TIMEOUT, workers=WORKERS):
+    """Run every probe concurrently and return the report"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        interface = pool.submit(probe_interface, timeout)
+        futures = []
+        for target in targets:
+            futures.append(pool.submit(probe_route, target, timeout))
+            futures.append(pool.submit(probe_ping, target, timeout))
+            futures.append(pool.submit(probe_traceroute, target, timeout * 3))
+        for name in dns_names:
+            futures.append(pool.submit(probe_dns, name, timeout))
+        probes = [interface.result()] + [f.result() for f in futures]
+    if peer:
+        # Runs alone, so the upload does not load the tunnel while the
+        # pings measure it, and the echo latency is taken on an idle link
+        probes.append(probe_peer(peer, port, timeout, probes[0].get("vpn_ip")))
+
+    counts = {status: sum(1 for p in probes if p["status"] == status)
+              for status in ("pass", "warn", "fail")}
+    vpn_ip = probes[0].get("vpn_ip")
+    hops_ok = all(p["status"] == "pass" for p in probes if p["probe"] == "traceroute")
+    if not vpn_ip:
+        status = "not connected"
+    elif hops_ok:
+        status = "working"
+    else:
+        status = "routing issues"
+    return {
+        "host": socket.gethostname(),
+        "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "vpn_ip": vpn_ip,
+        "status": status,
+        "summary": counts,
+        "duration_s": round(time.perf_counter() - started, 2),
+        "probes": probes,
+    }
+
+
+def print_report(report):
+    marks = {"pass": "✓", "warn": "⚠", "fail": "✗"}
+    print("=== VPN Connection Verification ===")
+    for probe in report["probes"]:
+        print(f"{marks[probe['status']]} {probe['probe']:<10} {probe['target']:<20} "
+              f"{probe['detail']}")
+        for key in ("route", "first_hop", "rtt_avg_ms", "rtt_p95_ms", "throughput_mbps"):
+            if probe.get(key) is not None:
+                print(f"    {key}: {probe[key]}")
+    print("")
+    icon = {"working": "🟢", "routing issues": "🟡", "not connected": "🔴"}
+    print(f"{icon[report['status']]} VPN Status: {report['status'].upper()}")
+    print(f"   VPN IP: {report['vpn_ip'] or '-'}")
+    print(f"   Probes: {report['summary']['pass']} passed, {report['summary']['warn']} "
+          f"warnings, {report['summary']['fail']} failed in {report['duration_s']}s")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        parser = argparse.ArgumentParser(description="Run the VPN verify peer")
+        parser.add_argument("serve")
+        parser.add_argument("--host", default=VPN_SERVER_IP,
+                            help=f"address to listen on (default: {VPN_SERVER_IP})")
+        parser.add_argument("--port", type=int, default=PEER_PORT)
+        args = parser.parse_args()
+        serve(args.host, args.port)
+        return
+
+    parser = argparse.ArgumentParser(description="Verify the OpenVPN connection")
+    parser.add_argument("targets", nargs="*", default=DEFAULT_TARGETS)
+    parser.add_argument("--dns", nargs="*", default=DNS_NAMES,
+                        help="hostnames to resolve")
+    parser.add_argument("--peer", help="VPN peer running 'vpn_verify.py serve'")
+    parser.add_argument("--port", type=int, default=PEER_PORT)
+    parser.add_argument("--timeout", type=int, default=TIMEOUT,
+                        help="per-probe timeout in seconds")
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    parser.add_argument("--append", metavar="FILE",
+                        help="append the report to FILE as one JSON line")
+    args = parser.parse_args()
+
+    report = verify(args.targets, args.dns, args.peer, args.port, args.timeout)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if args.append:
+        with open(args.append, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report) + "\n")
+    sys.exit(0 if report["summary"]["fail"] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()